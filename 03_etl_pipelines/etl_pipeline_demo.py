@@ -7,6 +7,16 @@ import json
 import csv
 from datetime import datetime
 
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pv
+except ImportError:  # Optional - fall back to csv.DictReader and per-record dicts
+    pa = None
+
+# Values treated as missing during TRANSFORM
+_NULLS = frozenset(('', 'null', 'None'))
+
 class SimpleETLPipeline:
     """Demonstrates ETL pattern that Airflow would orchestrate"""
     
@@ -20,10 +30,14 @@ class SimpleETLPipeline:
         print("📤 EXTRACT: Reading data...")
         data = []
         try:
-            if self.source.endswith('.csv'):
-                with open(self.source, 'r') as f:
-                    reader = csv.DictReader(f)
-                    data = list(reader)
+            if self.source.endswith('.csv') and pa is not None:
+                try:
+                    data = self._read_csv_table()
+                except pa.ArrowInvalid:
+                    # Arrow rejects ragged rows (and empty files); DictReader takes them
+                    data = self._read_csv_records()
+            elif self.source.endswith('.csv'):
+                data = self._read_csv_records()
             elif self.source.endswith('.json'):
                 with open(self.source, 'r') as f:
                     data = json.load(f)
@@ -37,24 +51,72 @@ class SimpleETLPipeline:
             self.log.append(f"❌ Extraction failed: {e}")
             raise
     
+    def _read_csv_records(self):
+        """Parse a CSV source into one dict per row"""
+        with open(self.source, 'r') as f:
+            reader = csv.DictReader(f)
+            return list(reader)
+    
+    def _read_csv_table(self):
+        """Parse a CSV source into an Arrow table with every column kept as text"""
+        # Read the header so every column can be typed as a string, like DictReader
+        with open(self.source, 'r', newline='') as f:
+            header = next(csv.reader(f), [])
+        return pv.read_csv(
+            self.source,
+            read_options=pv.ReadOptions(use_threads=True, block_size=1 << 20),
+            convert_options=pv.ConvertOptions(column_types={name: pa.string() for name in header})
+        )
+    
+    def _transform_table(self, table, processed_date):
+        """Columnar TRANSFORM for Arrow tables - same steps as the record loop"""
+        # 1. Standardize field names
+        table = table.rename_columns([name.lower().strip() for name in table.column_names])
+        
+        # 2. Handle missing values
+        null_values = pa.array(sorted(_NULLS))
+        columns = []
+        for column in table.columns:
+            if pa.types.is_string(column.type):
+                column = pc.if_else(pc.is_in(column, value_set=null_values),
+                                    pa.scalar(None, column.type), column)
+            columns.append(column)
+        table = pa.table(columns, names=table.column_names)
+        
+        # 3. Add metadata
+        table = table.append_column('processed_date', pa.repeat(processed_date, table.num_rows))
+        return table.append_column('data_source', pa.repeat(self.source, table.num_rows))
+    
     def transform(self, data):
         """TRANSFORM phase - Clean and enrich"""
         print("🔄 TRANSFORM: Processing data...")
+        
+        if pa is not None and isinstance(data, pa.Table):
+            transformed = self._transform_table(data, datetime.now().isoformat())
+            self.log.append(f"Transformed {len(transformed)} records at {datetime.now()}")
+            print(f"   ✅ Transformed {len(transformed)} records")
+            return transformed
+        
         transformed = []
         
+        # Same for every record - one timestamp per run
+        processed_date = datetime.now().isoformat()
+        data_source = self.source
+        key_map = {}
+        
         for record in data:
             # Example transformations
-            # 1. Standardize field names
-            cleaned = {k.lower().strip(): v for k, v in record.items()}
+            # 1. Standardize field names (normalized once per distinct key)
+            if not record.keys() <= key_map.keys():
+                key_map.update({k: k.lower().strip() for k in record if k not in key_map})
             
             # 2. Handle missing values
-            for key in cleaned:
-                if cleaned[key] in ('', 'null', 'None'):
-                    cleaned[key] = None
+            cleaned = {key_map[k]: (None if isinstance(v, str) and v in _NULLS else v)
+                       for k, v in record.items()}
             
             # 3. Add metadata
-            cleaned['processed_date'] = datetime.now().isoformat()
-            cleaned['data_source'] = self.source
+            cleaned['processed_date'] = processed_date
+            cleaned['data_source'] = data_source
             
             transformed.append(cleaned)
         
@@ -67,15 +129,21 @@ class SimpleETLPipeline:
         print("📥 LOAD: Writing data...")
         
         try:
-            with open(self.target, 'w') as f:
-                if self.target.endswith('.json'):
-                    json.dump(data, f, indent=2)
-                else:
-                    # Default to CSV
-                    if data:
-                        writer = csv.DictWriter(f, fieldnames=data[0].keys())
-                        writer.writeheader()
-                        writer.writerows(data)
+            if pa is not None and isinstance(data, pa.Table) and not self.target.endswith('.json'):
+                # Columnar end to end - Arrow's CSV writer dumps whole columns
+                pv.write_csv(data, self.target)
+            else:
+                if pa is not None and isinstance(data, pa.Table):
+                    data = data.to_pylist()
+                with open(self.target, 'w') as f:
+                    if self.target.endswith('.json'):
+                        json.dump(data, f, indent=2)
+                    else:
+                        # Default to CSV
+                        if data:
+                            writer = csv.DictWriter(f, fieldnames=data[0].keys())
+                            writer.writeheader()
+                            writer.writerows(data)
             
             self.log.append(f"Loaded {len(data)} records to {self.target} at {datetime.now()}")
             print(f"   ✅ Loaded {len(data)} records to {self.target}")
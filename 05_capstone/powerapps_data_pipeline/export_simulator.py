@@ -1,6 +1,3 @@
-## 📄 File 2: export_simulator.py
-
-```python
 """
 PowerApps Export Simulator
 Simulates exporting data from PowerApps via REST API
@@ -12,8 +9,13 @@ import random
 from datetime import datetime, timedelta
 import os
 import argparse
-from typing import List, Dict, Any
-import uuid
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # Optional - fall back to the stdlib encoder
+    orjson = None
 
 class PowerAppsExportSimulator:
     """
@@ -21,10 +23,14 @@ class PowerAppsExportSimulator:
     Creates realistic sample data matching PowerApps Common Data Service structure
     """
     
-    def __init__(self, output_dir: str = "sample_exports"):
+    def __init__(self, output_dir: str = "sample_exports", seed: Optional[int] = None):
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
         
+        # Private generators, so a seed makes the generated records reproducible
+        self.random = random.Random(seed)
+        self.rng = np.random.default_rng(seed)
+        
         # Sample data domains
         self.sales_stages = ['Prospecting', 'Qualification', 'Needs Analysis', 
                             'Proposal', 'Negotiation', 'Closed Won', 'Closed Lost']
@@ -35,13 +41,31 @@ class PowerAppsExportSimulator:
             'Acme Corp', 'Globex Inc', 'Initech', 'Umbrella Corp', 
             'Stark Industries', 'Wayne Enterprises', 'Oscorp', 'Cyberdyne Systems'
         ]
+        self.feedback_types = ['Product', 'Service', 'Support', 'General']
+        self.feedback_comments = [
+            "Great product, very satisfied",
+            "Support response time could be better",
+            "Excellent service, will recommend",
+            "Need more documentation",
+            "Perfect solution for our needs",
+            "",
+            None
+        ]
         
+        # Rating distribution skews positive; kept as arrays so batches draw in one call
+        self._ratings = np.arange(1, 6)
+        self._rating_p = np.array([0.05, 0.1, 0.2, 0.3, 0.35])
+        
+    def _short_id(self) -> str:
+        """8 hex digit record id (same shape as a truncated uuid4), drawn from the seeded generator"""
+        return f"{self.random.getrandbits(32):08x}"
+    
     def generate_sales_opportunity(self, date: datetime) -> Dict[str, Any]:
         """Generate a single sales opportunity record (like PowerApps Sales table)"""
         
         # Randomly determine if won/lost for closed opportunities
-        stage = random.choice(self.sales_stages)
-        amount = round(random.uniform(10000, 500000), 2)
+        stage = self.random.choice(self.sales_stages)
+        amount = round(self.random.uniform(10000, 500000), 2)
         
         if stage == 'Closed Won':
             probability = 100
@@ -50,51 +74,50 @@ class PowerAppsExportSimulator:
             probability = 0
             actual_revenue = 0
         else:
-            probability = random.randint(10, 90)
+            probability = self.random.randint(10, 90)
             actual_revenue = 0
         
         return {
-            'opportunity_id': str(uuid.uuid4())[:8],
-            'name': f"Opportunity {random.randint(1000, 9999)}",
-            'customer': random.choice(self.customers),
-            'product': random.choice(self.products),
+            'opportunity_id': self._short_id(),
+            'name': f"Opportunity {self.random.randint(1000, 9999)}",
+            'customer': self.random.choice(self.customers),
+            'product': self.random.choice(self.products),
             'amount': amount,
             'probability': probability,
             'stage': stage,
-            'region': random.choice(self.regions),
-            'sales_rep': f"rep{random.randint(1, 20)}@company.com",
+            'region': self.random.choice(self.regions),
+            'sales_rep': f"rep{self.random.randint(1, 20)}@company.com",
             'created_date': date.isoformat(),
-            'close_date': (date + timedelta(days=random.randint(30, 180))).isoformat(),
+            'close_date': (date + timedelta(days=self.random.randint(30, 180))).isoformat(),
             'actual_revenue': actual_revenue,
-            'notes': f"Sample opportunity for {random.choice(self.products)}",
+            'notes': f"Sample opportunity for {self.random.choice(self.products)}",
             'last_modified': datetime.now().isoformat()
         }
     
     def generate_customer_feedback(self, date: datetime) -> Dict[str, Any]:
         """Generate customer feedback records (like PowerApps Feedback form)"""
-        
-        ratings = [1, 2, 3, 4, 5]
-        feedback_types = ['Product', 'Service', 'Support', 'General']
-        
-        return {
-            'feedback_id': str(uuid.uuid4())[:8],
-            'customer': random.choice(self.customers),
-            'feedback_type': random.choice(feedback_types),
-            'rating': random.choices(ratings, weights=[0.05, 0.1, 0.2, 0.3, 0.35])[0],
-            'comment': random.choice([
-                "Great product, very satisfied",
-                "Support response time could be better",
-                "Excellent service, will recommend",
-                "Need more documentation",
-                "Perfect solution for our needs",
-                "",
-                None
-            ]),
-            'submitted_date': date.isoformat(),
-            'responded': random.choice([True, False]),
-            'response_days': random.randint(0, 5) if random.choice([True, False]) else None,
-            'source': random.choice(['Web', 'Mobile', 'Email'])
-        }
+        return self.generate_feedback_batch(date, 1)[0]
+    
+    def generate_feedback_batch(self, date: datetime, n: int) -> List[Dict[str, Any]]:
+        """Generate n feedback records, drawing all ratings in one vectorized call"""
+        
+        ratings = self.rng.choice(self._ratings, size=n, p=self._rating_p).tolist()
+        submitted_date = date.isoformat()
+        
+        return [
+            {
+                'feedback_id': self._short_id(),
+                'customer': self.random.choice(self.customers),
+                'feedback_type': self.random.choice(self.feedback_types),
+                'rating': rating,
+                'comment': self.random.choice(self.feedback_comments),
+                'submitted_date': submitted_date,
+                'responded': self.random.choice([True, False]),
+                'response_days': self.random.randint(0, 5) if self.random.choice([True, False]) else None,
+                'source': self.random.choice(['Web', 'Mobile', 'Email'])
+            }
+            for rating in ratings
+        ]
     
     def generate_inventory_item(self, date: datetime) -> Dict[str, Any]:
         """Generate inventory records (like PowerApps Inventory app)"""
@@ -102,7 +125,7 @@ class PowerAppsExportSimulator:
         locations = ['Warehouse A', 'Warehouse B', 'Distribution Center', 'Retail Store']
         statuses = ['In Stock', 'Low Stock', 'Out of Stock', 'On Order']
         
-        quantity = random.randint(0, 500)
+        quantity = self.random.randint(0, 500)
         if quantity == 0:
             status = 'Out of Stock'
         elif quantity < 50:
@@ -111,28 +134,28 @@ class PowerAppsExportSimulator:
             status = 'In Stock'
         
         return {
-            'item_id': str(uuid.uuid4())[:8],
-            'sku': f"SKU-{random.randint(10000, 99999)}",
-            'product': random.choice(self.products),
-            'category': random.choice(['Hardware', 'Software', 'Accessories']),
+            'item_id': self._short_id(),
+            'sku': f"SKU-{self.random.randint(10000, 99999)}",
+            'product': self.random.choice(self.products),
+            'category': self.random.choice(['Hardware', 'Software', 'Accessories']),
             'quantity': quantity,
             'status': status,
-            'location': random.choice(locations),
-            'reorder_point': random.randint(25, 100),
-            'unit_cost': round(random.uniform(10, 2000), 2),
-            'unit_price': round(random.uniform(20, 4000), 2),
+            'location': self.random.choice(locations),
+            'reorder_point': self.random.randint(25, 100),
+            'unit_cost': round(self.random.uniform(10, 2000), 2),
+            'unit_price': round(self.random.uniform(20, 4000), 2),
             'last_updated': date.isoformat(),
-            'supplier': f"Supplier {random.randint(1, 10)}",
-            'lead_time_days': random.randint(3, 30)
+            'supplier': f"Supplier {self.random.randint(1, 10)}",
+            'lead_time_days': self.random.randint(3, 30)
         }
     
     def generate_daily_export(self, date: datetime) -> Dict[str, Any]:
         """Generate a complete export for one day with all record types"""
         
         # Generate varying numbers of records per day
-        num_opportunities = random.randint(50, 200)
-        num_feedback = random.randint(20, 100)
-        num_inventory = random.randint(100, 300)
+        num_opportunities = self.random.randint(50, 200)
+        num_feedback = self.random.randint(20, 100)
+        num_inventory = self.random.randint(100, 300)
         
         export = {
             'export_date': date.isoformat(),
@@ -146,7 +169,7 @@ class PowerAppsExportSimulator:
             },
             'data': {
                 'opportunities': [self.generate_sales_opportunity(date) for _ in range(num_opportunities)],
-                'feedback': [self.generate_customer_feedback(date) for _ in range(num_feedback)],
+                'feedback': self.generate_feedback_batch(date, num_feedback),
                 'inventory': [self.generate_inventory_item(date) for _ in range(num_inventory)]
             }
         }
@@ -165,8 +188,12 @@ class PowerAppsExportSimulator:
             filename = f"powerapps_export_{export_date.strftime('%Y%m%d')}.json"
             filepath = os.path.join(self.output_dir, filename)
             
-            with open(filepath, 'w') as f:
-                json.dump(export_data, f, indent=2)
+            if orjson is not None:
+                with open(filepath, 'wb') as f:
+                    f.write(orjson.dumps(export_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+            else:
+                with open(filepath, 'w') as f:
+                    json.dump(export_data, f, indent=2)
             
             print(f"✅ Generated: {filename} - {export_data['record_counts']}")
     
@@ -185,10 +212,18 @@ class PowerAppsExportSimulator:
         
         return all_exports
 
+def run(days: int = 7, output_dir: str = "sample_exports",
+        seed: Optional[int] = None) -> PowerAppsExportSimulator:
+    """Generate sample exports - shared by the CLI and the pipeline orchestrator"""
+    simulator = PowerAppsExportSimulator(output_dir, seed)
+    simulator.generate_historical_exports(days)
+    return simulator
+
 def main():
     parser = argparse.ArgumentParser(description='Generate sample PowerApps export data')
     parser.add_argument('--days', type=int, default=7, help='Number of days of data to generate')
     parser.add_argument('--output', type=str, default='sample_exports', help='Output directory')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible data')
     
     args = parser.parse_args()
     
@@ -196,8 +231,7 @@ def main():
     print("📤 PowerApps Export Simulator")
     print("="*60)
     
-    simulator = PowerAppsExportSimulator(args.output)
-    simulator.generate_historical_exports(args.days)
+    run(args.days, args.output, args.seed)
     
     print("\n" + "="*60)
     print(f"✅ Generated {args.days} days of sample data in '{args.output}/'")
@@ -4,14 +4,22 @@ Loads processed data into SQLite/PostgreSQL
 """
 
 import pandas as pd
+import numpy as np
 import sqlite3
 import os
 import argparse
+import shutil
+import subprocess
 from datetime import datetime
+from pathlib import Path
 import logging
 from typing import Dict, List, Any, Optional
 import json
-import glob
+
+try:
+    import orjson
+except ImportError:  # Optional - fall back to the stdlib decoder
+    orjson = None
 
 # Set up logging
 logging.basicConfig(
@@ -20,31 +28,93 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Let sqlite3 bind numpy scalars directly instead of casting whole columns first
+sqlite3.register_adapter(np.bool_, int)
+sqlite3.register_adapter(np.int64, int)
+
+# Entity tables whose row counts are tracked in table_counts
+COUNTED_TABLES = ['opportunities', 'customer_feedback', 'inventory']
+
+# Every table create_tables() makes - the only names dump_json will query
+WAREHOUSE_TABLES = COUNTED_TABLES + ['load_history', 'sales_summary', 'table_counts']
+
+# Column order for each entity table's INSERT
+OPPORTUNITY_COLUMNS = [
+    'opportunity_id', 'name', 'customer', 'product', 'amount', 'probability',
+    'stage', 'region', 'sales_rep', 'created_date', 'close_date', 'actual_revenue',
+    'notes', 'weighted_amount', 'days_to_close', 'deal_size', 'high_value',
+    'created_month', 'created_year'
+]
+FEEDBACK_COLUMNS = [
+    'feedback_id', 'customer', 'feedback_type', 'rating', 'comment',
+    'submitted_date', 'responded', 'response_days', 'source',
+    'sentiment', 'has_comment', 'responded_within_2days', 'submitted_month'
+]
+INVENTORY_COLUMNS = [
+    'item_id', 'sku', 'product', 'category', 'quantity', 'status',
+    'location', 'reorder_point', 'unit_cost', 'unit_price',
+    'last_updated', 'supplier', 'lead_time_days', 'inventory_value',
+    'potential_revenue', 'margin', 'margin_percent', 'needs_reorder',
+    'health_score', 'turnover_category'
+]
+
+# Month periods are stored as their 'YYYY-MM' text
+TEXT_COLUMNS = {'created_month', 'submitted_month'}
+
+def _to_sqlite_timestamp(values: pd.Series) -> pd.Series:
+    """Render timestamps as 'YYYY-MM-DD HH:MM:SS' text without reparsing ISO strings"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        # Parquet keeps datetime64 - format in numpy rather than strftime per row
+        text = pd.Series(np.datetime_as_string(values.to_numpy(dtype='datetime64[s]')), index=values.index)
+        values = text.where(values.notna())
+    return values.str.replace('T', ' ', n=1, regex=False).str.slice(0, 19)
+
 class PowerAppsDataLoader:
     """
     Loads transformed PowerApps data into database
     """
     
-    def __init__(self, db_path: str = "data_warehouse.db", processed_dir: str = "processed_data"):
+    def __init__(self, db_path: str = "data_warehouse.db", processed_dir: str = "processed_data",
+                 uri: bool = False):
         self.db_path = db_path
         self.processed_dir = processed_dir
+        # With uri=True, db_path is a sqlite URI (e.g. "file:name?mode=memory&cache=shared")
+        self.uri = uri
         self.conn = None
         self.load_history = []
         
     def connect(self):
         """Establish database connection"""
-        self.conn = sqlite3.connect(self.db_path)
+        self.conn = sqlite3.connect(self.db_path, uri=self.uri)
         self.conn.row_factory = sqlite3.Row
         logger.info(f"Connected to database: {self.db_path}")
         
         # Enable foreign keys
         self.conn.execute("PRAGMA foreign_keys = ON")
         
+        # WAL lets readers (e.g. the pipeline report) query while a load is writing
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        
+        # INSERT OR REPLACE only fires delete triggers with recursive triggers on,
+        # which the row-count triggers rely on
+        self.conn.execute("PRAGMA recursive_triggers = ON")
+        
         return self.conn
     
+    def close(self):
+        """Checkpoint the WAL back into the database and close the connection"""
+        if self.conn is not None:
+            # Leave no -wal content behind for later (read-only) connections to trip over
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.close()
+            self.conn = None
+    
     def create_tables(self):
         """Create database tables if they don't exist"""
         
+        # Entity tables are keyed on their TEXT id, so store rows directly in the
+        # primary-key B-tree (WITHOUT ROWID). Existing databases keep their old layout.
+        
         # Opportunities table
         self.conn.execute("""
             CREATE TABLE IF NOT EXISTS opportunities (
@@ -68,7 +138,7 @@ class PowerAppsDataLoader:
                 created_month TEXT,
                 created_year INTEGER,
                 loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+            ) WITHOUT ROWID
         """)
         
         # Feedback table
@@ -88,7 +158,7 @@ class PowerAppsDataLoader:
                 responded_within_2days BOOLEAN,
                 submitted_month TEXT,
                 loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+            ) WITHOUT ROWID
         """)
         
         # Inventory table
@@ -115,7 +185,7 @@ class PowerAppsDataLoader:
                 health_score INTEGER,
                 turnover_category TEXT,
                 loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+            ) WITHOUT ROWID
         """)
         
         # Load history tracking
@@ -147,48 +217,82 @@ class PowerAppsDataLoader:
             )
         """)
         
+        # Row counts maintained by triggers so reports don't need COUNT(*) scans
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS table_counts (
+                table_name TEXT PRIMARY KEY,
+                row_count INTEGER NOT NULL
+            )
+        """)
+        
+        for table in COUNTED_TABLES:
+            # Seed from the table itself so databases created before this table line up
+            self.conn.execute(f"""
+                INSERT OR IGNORE INTO table_counts (table_name, row_count)
+                SELECT '{table}', COUNT(*) FROM {table}
+            """)
+            self.conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_count_insert AFTER INSERT ON {table}
+                BEGIN
+                    UPDATE table_counts SET row_count = row_count + 1 WHERE table_name = '{table}';
+                END
+            """)
+            self.conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_count_delete AFTER DELETE ON {table}
+                BEGIN
+                    UPDATE table_counts SET row_count = row_count - 1 WHERE table_name = '{table}';
+                END
+            """)
+        
         self.conn.commit()
         logger.info("Tables created/verified")
     
-    def load_opportunities(self, df: pd.DataFrame, source_file: str) -> int:
+    def _insert_rows(self, table: str, columns: List[str], df: pd.DataFrame, id_column: str,
+                     batch_size: Optional[int] = None) -> int:
+        """
+        Upsert a DataFrame into `table` with executemany (in chunks of
+        `batch_size` rows if given) inside one transaction; falls back to
+        row-by-row inserts if that fails so bad rows are logged and skipped
+        as before
+        """
+        frame = df.reindex(columns=columns)
+        for col in TEXT_COLUMNS.intersection(columns):
+            frame[col] = frame[col].astype(str)
+        
+        sql = f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        rows = list(frame.itertuples(index=False, name=None))
+        step = batch_size or len(rows) or 1
+        
+        try:
+            with self.conn:
+                for start in range(0, len(rows), step):
+                    self.conn.executemany(sql, rows[start:start + step])
+            return len(rows)
+        except sqlite3.Error as e:
+            logger.warning(f"Batch insert into {table} failed ({e}), retrying row by row")
+        
+        records_loaded = 0
+        id_pos = columns.index(id_column)
+        with self.conn:
+            for row in rows:
+                try:
+                    self.conn.execute(sql, row)
+                    records_loaded += 1
+                except sqlite3.Error as e:
+                    logger.error(f"Error loading {table} row {row[id_pos]}: {e}")
+        return records_loaded
+    
+    def load_opportunities(self, df: pd.DataFrame, source_file: str, batch_size: Optional[int] = None) -> int:
         """Load opportunities data"""
         
         # Ensure date columns are strings for SQLite
         for col in ['created_date', 'close_date']:
             if col in df.columns:
-                df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Convert boolean to integer for SQLite
-        df['high_value'] = df['high_value'].astype(int)
+                df[col] = _to_sqlite_timestamp(df[col])
         
-        # Insert records
-        records_loaded = 0
+        records_loaded = self._insert_rows('opportunities', OPPORTUNITY_COLUMNS, df, 'opportunity_id', batch_size)
         cursor = self.conn.cursor()
         
-        for _, row in df.iterrows():
-            try:
-                cursor.execute("""
-                    INSERT OR REPLACE INTO opportunities (
-                        opportunity_id, name, customer, product, amount, probability,
-                        stage, region, sales_rep, created_date, close_date, actual_revenue,
-                        notes, weighted_amount, days_to_close, deal_size, high_value,
-                        created_month, created_year
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    row.get('opportunity_id'), row.get('name'), row.get('customer'),
-                    row.get('product'), row.get('amount'), row.get('probability'),
-                    row.get('stage'), row.get('region'), row.get('sales_rep'),
-                    row.get('created_date'), row.get('close_date'), row.get('actual_revenue'),
-                    row.get('notes'), row.get('weighted_amount'), row.get('days_to_close'),
-                    row.get('deal_size'), row.get('high_value'),
-                    str(row.get('created_month')), row.get('created_year')
-                ))
-                records_loaded += 1
-            except Exception as e:
-                logger.error(f"Error loading opportunity {row.get('opportunity_id')}: {e}")
-        
-        self.conn.commit()
-        
         # Track load history
         cursor.execute("""
             INSERT INTO load_history (source_file, entity, records_loaded, status)
@@ -199,38 +303,14 @@ class PowerAppsDataLoader:
         logger.info(f"Loaded {records_loaded} opportunities")
         return records_loaded
     
-    def load_feedback(self, df: pd.DataFrame, source_file: str) -> int:
+    def load_feedback(self, df: pd.DataFrame, source_file: str, batch_size: Optional[int] = None) -> int:
         """Load feedback data"""
         
-        df['submitted_date'] = pd.to_datetime(df['submitted_date']).dt.strftime('%Y-%m-%d %H:%M:%S')
-        df['responded'] = df['responded'].astype(int)
-        df['has_comment'] = df['has_comment'].astype(int)
-        df['responded_within_2days'] = df['responded_within_2days'].astype(int)
+        df['submitted_date'] = _to_sqlite_timestamp(df['submitted_date'])
         
-        records_loaded = 0
+        records_loaded = self._insert_rows('customer_feedback', FEEDBACK_COLUMNS, df, 'feedback_id', batch_size)
         cursor = self.conn.cursor()
         
-        for _, row in df.iterrows():
-            try:
-                cursor.execute("""
-                    INSERT OR REPLACE INTO customer_feedback (
-                        feedback_id, customer, feedback_type, rating, comment,
-                        submitted_date, responded, response_days, source,
-                        sentiment, has_comment, responded_within_2days, submitted_month
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    row.get('feedback_id'), row.get('customer'), row.get('feedback_type'),
-                    row.get('rating'), row.get('comment'), row.get('submitted_date'),
-                    row.get('responded'), row.get('response_days'), row.get('source'),
-                    row.get('sentiment'), row.get('has_comment'),
-                    row.get('responded_within_2days'), str(row.get('submitted_month'))
-                ))
-                records_loaded += 1
-            except Exception as e:
-                logger.error(f"Error loading feedback {row.get('feedback_id')}: {e}")
-        
-        self.conn.commit()
-        
         cursor.execute("""
             INSERT INTO load_history (source_file, entity, records_loaded, status)
             VALUES (?, ?, ?, ?)
@@ -240,41 +320,14 @@ class PowerAppsDataLoader:
         logger.info(f"Loaded {records_loaded} feedback records")
         return records_loaded
     
-    def load_inventory(self, df: pd.DataFrame, source_file: str) -> int:
+    def load_inventory(self, df: pd.DataFrame, source_file: str, batch_size: Optional[int] = None) -> int:
         """Load inventory data"""
         
-        df['last_updated'] = pd.to_datetime(df['last_updated']).dt.strftime('%Y-%m-%d %H:%M:%S')
-        df['needs_reorder'] = df['needs_reorder'].astype(int)
+        df['last_updated'] = _to_sqlite_timestamp(df['last_updated'])
         
-        records_loaded = 0
+        records_loaded = self._insert_rows('inventory', INVENTORY_COLUMNS, df, 'item_id', batch_size)
         cursor = self.conn.cursor()
         
-        for _, row in df.iterrows():
-            try:
-                cursor.execute("""
-                    INSERT OR REPLACE INTO inventory (
-                        item_id, sku, product, category, quantity, status,
-                        location, reorder_point, unit_cost, unit_price,
-                        last_updated, supplier, lead_time_days, inventory_value,
-                        potential_revenue, margin, margin_percent, needs_reorder,
-                        health_score, turnover_category
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    row.get('item_id'), row.get('sku'), row.get('product'),
-                    row.get('category'), row.get('quantity'), row.get('status'),
-                    row.get('location'), row.get('reorder_point'), row.get('unit_cost'),
-                    row.get('unit_price'), row.get('last_updated'), row.get('supplier'),
-                    row.get('lead_time_days'), row.get('inventory_value'),
-                    row.get('potential_revenue'), row.get('margin'),
-                    row.get('margin_percent'), row.get('needs_reorder'),
-                    row.get('health_score'), row.get('turnover_category')
-                ))
-                records_loaded += 1
-            except Exception as e:
-                logger.error(f"Error loading inventory {row.get('item_id')}: {e}")
-        
-        self.conn.commit()
-        
         cursor.execute("""
             INSERT INTO load_history (source_file, entity, records_loaded, status)
             VALUES (?, ?, ?, ?)
@@ -322,7 +375,11 @@ class PowerAppsDataLoader:
     def load_all_processed_files(self):
         """Load all transformed parquet files"""
         
-        parquet_files = glob.glob(os.path.join(self.processed_dir, "transformed_*.parquet"))
+        with os.scandir(self.processed_dir) as entries:
+            parquet_files = [
+                entry.path for entry in entries
+                if entry.name.startswith('transformed_') and entry.name.endswith('.parquet')
+            ]
         
         logger.info(f"Found {len(parquet_files)} transformed files to load")
         
@@ -348,6 +405,15 @@ class PowerAppsDataLoader:
             else:
                 logger.warning(f"Unknown entity type: {entity}")
     
+    def get_row_count(self, table: str) -> int:
+        """Current row count of an entity table, read from table_counts (no table scan)"""
+        row = self.conn.execute(
+            "SELECT row_count FROM table_counts WHERE table_name = ?", (table,)
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"Row count not tracked for table: {table}")
+        return row[0]
+    
     def get_load_summary(self) -> pd.DataFrame:
         """Get summary of all loads"""
         query = """
@@ -361,6 +427,60 @@ class PowerAppsDataLoader:
             ORDER BY load_date DESC
         """
         return pd.read_sql_query(query, self.conn)
+    
+    def dump_json(self, table: str) -> List[Dict[str, Any]]:
+        """
+        Dump a whole table as a list of dicts, letting the sqlite3 CLI render
+        the rows as JSON rather than materialising them through Python cursors.
+        Falls back to a read-only Python connection when the shell is not
+        installed or the database is a URI (e.g. in-memory)
+        """
+        if table not in WAREHOUSE_TABLES:
+            raise ValueError(f"Unknown table: {table}")
+        
+        if self.uri or shutil.which('sqlite3') is None:
+            return self._dump_rows(table)
+        
+        result = subprocess.run(
+            ['sqlite3', '-readonly', '-json', self.db_path, f'SELECT * FROM "{table}"'],
+            capture_output=True,
+            check=True
+        )
+        
+        # The shell prints nothing at all for an empty result
+        if not result.stdout.strip():
+            return []
+        return orjson.loads(result.stdout) if orjson is not None else json.loads(result.stdout)
+    
+    def _dump_rows(self, table: str) -> List[Dict[str, Any]]:
+        """dump_json without the CLI - rows read through a read-only connection"""
+        if self.uri:
+            conn = sqlite3.connect(self.db_path, uri=True)
+        else:
+            conn = sqlite3.connect(f"{Path(self.db_path).resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            cursor = conn.execute(f'SELECT * FROM "{table}"')
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor]
+        finally:
+            conn.close()
+
+def run(db_path: str = "data_warehouse.db", processed_dir: str = "processed_data",
+        summary: bool = False):
+    """Load transformed files - shared by the CLI and the pipeline orchestrator"""
+    loader = PowerAppsDataLoader(db_path, processed_dir)
+    loader.connect()
+    
+    try:
+        loader.create_tables()
+        loader.load_all_processed_files()
+        loader.generate_sales_summary()
+        
+        if summary:
+            print("\n📊 Load Summary:")
+            print(loader.get_load_summary().to_string(index=False))
+    finally:
+        loader.conn.close()
 
 def main():
     parser = argparse.ArgumentParser(description='Load transformed data to database')
@@ -374,16 +494,7 @@ def main():
     print("📥 PowerApps Data Loader")
     print("="*60)
     
-    loader = PowerAppsDataLoader(args.db, args.processed)
-    loader.connect()
-    loader.create_tables()
-    loader.load_all_processed_files()
-    loader.generate_sales_summary()
-    
-    if args.summary:
-        print("\n📊 Load Summary:")
-        summary = loader.get_load_summary()
-        print(summary.to_string(index=False))
+    run(args.db, args.processed, args.summary)
     
     print("\n" + "="*60)
     print("✅ Data loading complete")
@@ -9,8 +9,27 @@ import subprocess
 import argparse
 from datetime import datetime
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
 import json
+import sqlite3
+import threading
 import time
+import asyncio
+import functools
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+from typing import Callable
+
+try:
+    import orjson
+except ImportError:  # Optional - fall back to the stdlib encoder
+    orjson = None
+
+import export_simulator
+import transform_processor
+import load_to_database
 
 # Set up logging
 logging.basicConfig(
@@ -19,158 +38,366 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def configure_logging() -> QueueListener:
+    """
+    CLI logging: hand records to a background listener so step threads never
+    block on handler I/O. Returns the started listener - stop it when done
+    """
+    # force=True so only the handler installed here is wrapped
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        force=True
+    )
+    root_logger = logging.getLogger()
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *root_logger.handlers, respect_handler_level=True)
+    root_logger.handlers = [QueueHandler(log_queue)]
+    listener.start()
+    return listener
+
+def _dumps(obj) -> bytes:
+    """Compact JSON encoding, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, default=str).encode()
+
+# Canonical step statuses, interned so status comparisons reduce to identity checks
+_STATUS = {s: sys.intern(s) for s in ('STARTED', 'COMPLETED', 'FAILED', 'SKIPPED')}
+
+# Modules the isolated step worker imports up front
+STEP_MODULES = ['export_simulator', 'transform_processor', 'load_to_database']
+
+def _warm_imports():
+    """Step worker initializer - pay the pandas/pyarrow import cost once"""
+    for module in STEP_MODULES:
+        __import__(module)
+
 class PowerAppsPipelineOrchestrator:
     """
     Orchestrates the complete PowerApps ETL pipeline
     """
     
-    def __init__(self, base_dir: str = "."):
+    _STATUS_ICONS = {
+        'STARTED': '🚀',
+        'COMPLETED': '✅',
+        'FAILED': '❌',
+        'SKIPPED': '⏭️'
+    }
+    
+    def __init__(self, base_dir: str = ".", isolate_steps: bool = False):
         self.base_dir = base_dir
-        self.pipeline_log = []
+        
+        # Optionally run steps in one long-lived worker process instead of in-process
+        self.isolate_steps = isolate_steps
+        self._pool = None
+        # Step log stored column-wise; pipeline_log rebuilds entries on demand
+        self._ts = []
+        self._step = []
+        self._status = []
+        self._details = []
+        self._status_counts = Counter()
+        self._last_step_ok = {}
+        # DAG steps log from worker threads; one lock keeps the columns aligned
+        self._log_lock = threading.Lock()
+        
+        # Last generated report; regenerated only after new steps are logged
+        # or the run timing it was built from changes
+        self._last_report = None
+        self._report_dirty = True
+        self._report_times = None
         self.start_time = None
         self.end_time = None
         
+        # Elapsed time comes from the monotonic clock; start/end stay wall-clock for display
+        self._t0 = None
+        self.duration = None
+        
+        # Read-only warehouse connection, opened on first report and reused
+        self._conn = None
+        
+        # Formatted timestamp is reused until the wall-clock second changes
+        self._last_sec = 0
+        self._last_str = ""
+        
+    def _report_connection(self) -> sqlite3.Connection:
+        """Open the warehouse read-only (once) for reporting queries"""
+        if self._conn is None:
+            self._conn = sqlite3.connect('file:data_warehouse.db?mode=ro', uri=True, check_same_thread=False)
+            self._conn.execute("PRAGMA mmap_size=268435456")
+            self._conn.execute("PRAGMA cache_size=-65536")
+        return self._conn
+    
+    def _step_pool(self) -> ProcessPoolExecutor:
+        """Start (once) the warm worker used when isolate_steps is set"""
+        if self._pool is None:
+            # forkserver forks workers from a preloaded server instead of booting
+            # a fresh interpreter per step
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                ctx = multiprocessing.get_context('forkserver')
+                ctx.set_forkserver_preload(STEP_MODULES)
+            else:
+                ctx = multiprocessing.get_context('spawn')
+            self._pool = ProcessPoolExecutor(max_workers=1, mp_context=ctx, initializer=_warm_imports)
+        return self._pool
+    
+    def close(self):
+        """Close the reporting connection and step worker if they were started"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+    
+    @property
+    def pipeline_log(self) -> list:
+        """Logged steps as a list of entry dicts"""
+        return [
+            {'timestamp': ts, 'step': step, 'status': status, 'details': details}
+            for ts, step, status, details in self._log_rows()
+        ]
+    
+    def _log_rows(self) -> zip:
+        """Step log as (timestamp, step, status, details) rows, snapshotted under the log lock"""
+        with self._log_lock:
+            return zip(self._ts[:], self._step[:], self._status[:], self._details[:])
+    
     def log_step(self, step: str, status: str, details: str = ""):
         """Log pipeline step"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_entry = {
-            'timestamp': timestamp,
-            'step': step,
-            'status': status,
-            'details': details
-        }
-        self.pipeline_log.append(log_entry)
+        status = _STATUS.get(status) or sys.intern(status)
+        sec = int(time.time())
+        with self._log_lock:
+            if sec != self._last_sec:
+                self._last_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(sec))
+                self._last_sec = sec
+            self._ts.append(self._last_str)
+            self._step.append(step)
+            self._status.append(status)
+            self._details.append(details)
+            self._status_counts[status] += 1
+            if status in ('COMPLETED', 'FAILED'):
+                self._last_step_ok[step] = status == 'COMPLETED'
+            self._report_dirty = True
         
-        status_icon = {
-            'STARTED': '🚀',
-            'COMPLETED': '✅',
-            'FAILED': '❌',
-            'SKIPPED': '⏭️'
-        }.get(status, '📌')
+        status_icon = self._STATUS_ICONS.get(status, '📌')
         
-        logger.info(f"{status_icon} {step}: {status} - {details}")
+        logger.info("%s %s: %s - %s", status_icon, step, status, details)
     
     def run_step(self, step_name: str, command: list, cwd: str = None) -> bool:
         """Run a pipeline step"""
-        self.log_step(step_name, 'STARTED', f"Running: {' '.join(command)}")
+        # Only build the detail strings when INFO is actually going to be emitted
+        verbose = logger.isEnabledFor(logging.INFO)
+        self.log_step(step_name, 'STARTED', f"Running: {' '.join(command)}" if verbose else "")
         
         try:
-            result = subprocess.run(
+            # Stream output as it arrives, keeping only a bounded tail for the log
+            tail = deque(maxlen=20)
+            with subprocess.Popen(
                 command,
                 cwd=cwd or self.base_dir,
-                capture_output=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
                 text=True,
-                check=False
-            )
+                bufsize=1
+            ) as proc:
+                for line in proc.stdout:
+                    print(line, end='')
+                    tail.append(line.rstrip())
+                returncode = proc.wait()
             
-            if result.returncode == 0:
-                self.log_step(step_name, 'COMPLETED', f"Output: {result.stdout[:200]}...")
+            if returncode == 0:
+                self.log_step(step_name, 'COMPLETED', f"Output: {' | '.join(tail)}" if verbose else "")
                 return True
             else:
-                self.log_step(step_name, 'FAILED', f"Error: {result.stderr[:200]}")
+                self.log_step(step_name, 'FAILED', "Error: " + "\n".join(tail))
                 return False
                 
         except Exception as e:
             self.log_step(step_name, 'FAILED', f"Exception: {str(e)}")
             return False
     
-    def run_full_pipeline(self, days: int = 7) -> bool:
+    def run_task(self, step_name: str, func: Callable, **kwargs) -> bool:
+        """Run a pipeline step in-process (or in the warm worker), without paying interpreter startup"""
+        self.log_step(step_name, 'STARTED', f"Running: {func.__module__}.{func.__name__}")
+        
+        try:
+            if self.isolate_steps:
+                self._step_pool().submit(functools.partial(func, **kwargs)).result()
+            else:
+                func(**kwargs)
+        except Exception as e:
+            self.log_step(step_name, 'FAILED', f"Exception: {str(e)}")
+            return False
+        
+        self.log_step(step_name, 'COMPLETED', f"{func.__module__}.{func.__name__} finished")
+        return True
+    
+    def build_workflow_dag(self, days: int = 7) -> dict:
         """
-        Run the complete ETL pipeline
+        Describe the pipeline as a DAG - each step waits only on its deps,
+        so steps without a data dependency can run side by side
         """
-        self.start_time = datetime.now()
+        return {
+            'generate': {
+                'deps': [],
+                'step': "Generate Sample Data",
+                'banner': "\n📤 STEP 1: Generating PowerApps Export Data",
+                'failure': "Failed at data generation",
+                'func': export_simulator.run,
+                'kwargs': {'days': days, 'output_dir': os.path.join(self.base_dir, "sample_exports")}
+            },
+            'transform': {
+                'deps': ['generate'],
+                'step': "Transform Data",
+                'banner': "\n🔄 STEP 2: Transforming Data",
+                'failure': "Failed at transformation",
+                'func': transform_processor.run,
+                'kwargs': {
+                    'input_dir': os.path.join(self.base_dir, "sample_exports"),
+                    'output_dir': os.path.join(self.base_dir, "processed_data")
+                }
+            },
+            'load': {
+                'deps': ['transform'],
+                'step': "Load to Database",
+                'banner': "\n📥 STEP 3: Loading to Database",
+                'failure': "Failed at database load",
+                'func': load_to_database.run,
+                'kwargs': {
+                    'db_path': os.path.join(self.base_dir, "data_warehouse.db"),
+                    'processed_dir': os.path.join(self.base_dir, "processed_data"),
+                    'summary': True
+                }
+            }
+        }
+    
+    async def run_dag(self, dag: dict) -> dict:
+        """Run DAG nodes on a thread pool as soon as their dependencies succeed"""
+        loop = asyncio.get_running_loop()
+        tasks = {}
         
-        print("\n" + "="*70)
-        print("🚀 POWERAPPS ETL PIPELINE ORCHESTRATOR")
-        print("="*70)
+        async def run_node(name: str) -> bool:
+            node = dag[name]
+            for dep in node['deps']:
+                if not await tasks[dep]:
+                    self.log_step(node['step'], 'SKIPPED', f"Upstream step '{dag[dep]['step']}' failed")
+                    return False
+            
+            print(node['banner'])
+            return await loop.run_in_executor(
+                executor, functools.partial(self.run_task, node['step'], node['func'], **node['kwargs'])
+            )
         
-        # Step 1: Generate sample data
-        print("\n📤 STEP 1: Generating PowerApps Export Data")
-        success = self.run_step(
-            "Generate Sample Data",
-            [sys.executable, "export_simulator.py", "--days", str(days)]
-        )
+        with ThreadPoolExecutor(max_workers=len(dag)) as executor:
+            for name in dag:
+                tasks[name] = asyncio.ensure_future(run_node(name))
+            results = await asyncio.gather(*tasks.values())
         
-        if not success:
-            self.log_step("Pipeline", 'FAILED', "Failed at data generation")
-            return False
+        return dict(zip(tasks, results))
+    
+    def run_full_pipeline(self, days: int = 7) -> bool:
+        """
+        Run the complete ETL pipeline
+        """
+        self.start_time = datetime.now()
+        self._t0 = time.monotonic()
         
-        # Step 2: Transform data
-        print("\n🔄 STEP 2: Transforming Data")
-        success = self.run_step(
-            "Transform Data",
-            [sys.executable, "transform_processor.py"]
-        )
+        sys.stdout.write("\n" + "="*70 + "\n🚀 POWERAPPS ETL PIPELINE ORCHESTRATOR\n" + "="*70 + "\n")
         
-        if not success:
-            self.log_step("Pipeline", 'FAILED', "Failed at transformation")
-            return False
+        # Steps 1-3: Generate, transform and load, scheduled by dependency
+        dag = self.build_workflow_dag(days)
+        results = asyncio.run(self.run_dag(dag))
         
-        # Step 3: Load to database
-        print("\n📥 STEP 3: Loading to Database")
-        success = self.run_step(
-            "Load to Database",
-            [sys.executable, "load_to_database.py", "--summary"]
-        )
+        for name, success in results.items():
+            if not success:
+                self.log_step("Pipeline", 'FAILED', dag[name]['failure'])
+                return False
         
-        if not success:
-            self.log_step("Pipeline", 'FAILED', "Failed at database load")
-            return False
+        # Run timing is final before the report, which records it
+        self.end_time = datetime.now()
+        duration = self.duration = time.monotonic() - self._t0
         
         # Step 4: Generate final report
         print("\n📊 STEP 4: Generating Pipeline Report")
         self.generate_pipeline_report()
         
-        self.end_time = datetime.now()
-        duration = (self.end_time - self.start_time).total_seconds()
-        
-        print("\n" + "="*70)
-        print(f"✅ PIPELINE COMPLETED SUCCESSFULLY in {duration:.2f} seconds")
-        print("="*70)
+        sys.stdout.write(
+            "\n" + "="*70 + f"\n✅ PIPELINE COMPLETED SUCCESSFULLY in {duration:.2f} seconds\n" + "="*70 + "\n"
+        )
         
         self.log_step("Pipeline", 'COMPLETED', f"Total duration: {duration:.2f}s")
         
         return True
     
-    def generate_pipeline_report(self):
+    def write_report(self, path: str, report: dict):
+        """
+        Write the report as JSON, streaming the step log one entry at a time
+        so it is never materialised as a list of dicts
+        """
+        with open(path, 'wb') as f:
+            f.write(b'{')
+            for key, value in report.items():
+                f.write(b'\n  ' + _dumps(key) + b': ' + _dumps(value) + b',')
+            
+            f.write(b'\n  "steps": [')
+            separator = b'\n    '
+            for ts, step, status, details in self._log_rows():
+                f.write(separator + _dumps({'timestamp': ts, 'step': step, 'status': status, 'details': details}))
+                separator = b',\n    '
+            f.write(b'\n  ]\n}\n')
+    
+    def generate_pipeline_report(self) -> dict:
         """Generate comprehensive pipeline report"""
         
+        # Nothing logged and same timing since the last report - reuse it
+        times = (self.start_time, self.end_time, self.duration)
+        if not self._report_dirty and self._last_report is not None and times == self._report_times:
+            return self._last_report
+        
+        start_time, end_time = self.start_time, self.end_time
+        start_iso = start_time.isoformat() if start_time else None
+        end_iso = end_time.isoformat() if end_time else None
+        
         report = {
             'pipeline_execution': {
-                'start_time': self.start_time.isoformat() if self.start_time else None,
-                'end_time': self.end_time.isoformat() if self.end_time else None,
-                'duration_seconds': (self.end_time - self.start_time).total_seconds() if self.end_time and self.start_time else None
-            },
-            'steps': self.pipeline_log
+                'start_time': start_iso,
+                'end_time': end_iso,
+                'duration_seconds': self.duration
+            }
         }
         
         # Add summary statistics
-        steps_completed = sum(1 for step in self.pipeline_log if step['status'] == 'COMPLETED')
-        steps_failed = sum(1 for step in self.pipeline_log if step['status'] == 'FAILED')
+        steps_completed = self._status_counts['COMPLETED']
+        steps_failed = self._status_counts['FAILED']
         
         report['summary'] = {
-            'total_steps': len(self.pipeline_log),
+            'total_steps': len(self._status),
             'steps_completed': steps_completed,
             'steps_failed': steps_failed,
-            'success_rate': (steps_completed / len(self.pipeline_log) * 100) if self.pipeline_log else 0
+            'success_rate': (steps_completed / len(self._status) * 100) if self._status else 0
         }
         
-        # Check if database exists and get record counts
-        if os.path.exists('data_warehouse.db'):
+        # Only query the database when this run actually loaded it
+        if self._last_step_ok.get('Load to Database'):
             try:
-                import sqlite3
-                conn = sqlite3.connect('data_warehouse.db')
-                cursor = conn.cursor()
-                
-                # Get record counts
-                cursor.execute("SELECT COUNT(*) FROM opportunities")
-                opp_count = cursor.fetchone()[0]
+                # A missing file surfaces here as OperationalError - mode=ro never creates one
+                cursor = self._report_connection().cursor()
                 
-                cursor.execute("SELECT COUNT(*) FROM customer_feedback")
-                feedback_count = cursor.fetchone()[0]
-                
-                cursor.execute("SELECT COUNT(*) FROM inventory")
-                inv_count = cursor.fetchone()[0]
+                # Get record counts (kept current by the loader's triggers)
+                try:
+                    cursor.execute("SELECT table_name, row_count FROM table_counts")
+                except sqlite3.OperationalError:
+                    # Database predates table_counts - count all three in one round trip
+                    cursor.execute("""
+                        SELECT 'opportunities', COUNT(*) FROM opportunities
+                        UNION ALL SELECT 'customer_feedback', COUNT(*) FROM customer_feedback
+                        UNION ALL SELECT 'inventory', COUNT(*) FROM inventory
+                    """)
+                counts = dict(cursor.fetchall())
+                opp_count = counts.get('opportunities', 0)
+                feedback_count = counts.get('customer_feedback', 0)
+                inv_count = counts.get('inventory', 0)
                 
                 report['database'] = {
                     'opportunities': opp_count,
@@ -178,49 +405,58 @@ class PowerAppsPipelineOrchestrator:
                     'inventory': inv_count,
                     'total_records': opp_count + feedback_count + inv_count
                 }
-                
-                conn.close()
             except Exception as e:
                 report['database'] = {'error': str(e)}
         
         # Save report
         report_filename = f"pipeline_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(report_filename, 'w') as f:
-            json.dump(report, f, indent=2, default=str)
+        self.write_report(report_filename, report)
         
-        logger.info(f"Pipeline report saved to {report_filename}")
+        logger.info("Pipeline report saved to %s", report_filename)
         
         # Print summary
-        print("\n📋 PIPELINE SUMMARY")
-        print("-" * 40)
-        print(f"Total Steps: {report['summary']['total_steps']}")
-        print(f"Completed: {report['summary']['steps_completed']}")
-        print(f"Failed: {report['summary']['steps_failed']}")
-        print(f"Success Rate: {report['summary']['success_rate']:.1f}%")
+        sys.stdout.write(
+            "\n📋 PIPELINE SUMMARY\n" + "-" * 40 + "\n"
+            f"Total Steps: {report['summary']['total_steps']}\n"
+            f"Completed: {report['summary']['steps_completed']}\n"
+            f"Failed: {report['summary']['steps_failed']}\n"
+            f"Success Rate: {report['summary']['success_rate']:.1f}%\n"
+        )
         
         if 'database' in report:
             print(f"\n💾 Database Records:")
             for table, count in report['database'].items():
                 if table != 'error':
                     print(f"  • {table}: {count:,}")
+        
+        self._last_report = report
+        self._report_times = times
+        self._report_dirty = False
+        return report
 
 def main():
     parser = argparse.ArgumentParser(description='Orchestrate PowerApps ETL pipeline')
     parser.add_argument('--days', type=int, default=7, help='Days of sample data to generate')
     parser.add_argument('--skip-gen', action='store_true', help='Skip data generation')
+    parser.add_argument('--isolate', action='store_true', help='Run steps in a separate warm worker process')
     
     args = parser.parse_args()
     
-    orchestrator = PowerAppsPipelineOrchestrator()
+    log_listener = configure_logging()
+    orchestrator = PowerAppsPipelineOrchestrator(isolate_steps=args.isolate)
     
-    if args.skip_gen:
-        # Run from step 2
-        print("\n⚠️ Skipping data generation, using existing files")
-        orchestrator.run_step("Transform Data", [sys.executable, "transform_processor.py"])
-        orchestrator.run_step("Load to Database", [sys.executable, "load_to_database.py", "--summary"])
-        orchestrator.generate_pipeline_report()
-    else:
-        orchestrator.run_full_pipeline(args.days)
+    try:
+        if args.skip_gen:
+            # Run from step 2
+            print("\n⚠️ Skipping data generation, using existing files")
+            orchestrator.run_task("Transform Data", transform_processor.run)
+            orchestrator.run_task("Load to Database", load_to_database.run, summary=True)
+            orchestrator.generate_pipeline_report()
+        else:
+            orchestrator.run_full_pipeline(args.days)
+    finally:
+        orchestrator.close()
+        log_listener.stop()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,298 @@
+"""
+Shared fixtures for the PowerApps pipeline tests
+
+Inputs that tests only read (sample exports, transformed parquet) are built
+once per session; anything a test writes to lives in its own tmp_path.
+"""
+
+import os
+import sys
+import json
+import importlib
+import pytest
+from types import SimpleNamespace
+
+try:
+    import orjson
+except ImportError:  # Optional - fall back to the stdlib encoder
+    orjson = None
+
+# Add parent directory to path so we can import pipeline modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Pipeline modules (and pandas/pyarrow) are only imported once a test needs them,
+# so collection-only runs stay cheap
+PIPELINE_MODULES = ['export_simulator', 'transform_processor', 'load_to_database', 'pipeline_orchestrator']
+
+
+# A single-day PowerApps export with one record per entity, encoded once at import
+SAMPLE_EXPORT = {
+    'export_date': '2024-01-15',
+    'data': {
+        'opportunities': [
+            {
+                'opportunity_id': 'TEST001',
+                'name': 'Test Opp',
+                'customer': 'Test Corp',
+                'product': 'Laptop',
+                'amount': 50000.0,
+                'probability': 80,
+                'stage': 'Negotiation',
+                'region': 'North America',
+                'sales_rep': 'test@email.com',
+                'created_date': '2024-01-15',
+                'close_date': '2024-03-15',
+                'actual_revenue': 0,
+                'notes': 'Test note',
+                'last_modified': '2024-01-15'
+            }
+        ],
+        'feedback': [
+            {
+                'feedback_id': 'FDBK001',
+                'customer': 'Test Corp',
+                'feedback_type': 'Product',
+                'rating': 4,
+                'comment': 'Great product',
+                'submitted_date': '2024-01-15',
+                'responded': True,
+                'response_days': 2,
+                'source': 'Web'
+            }
+        ],
+        'inventory': [
+            {
+                'item_id': 'INV001',
+                'sku': 'SKU001',
+                'product': 'Laptop',
+                'category': 'Hardware',
+                'quantity': 100,
+                'status': 'In Stock',
+                'location': 'Warehouse A',
+                'reorder_point': 20,
+                'unit_cost': 800.0,
+                'unit_price': 1200.0,
+                'last_updated': '2024-01-15',
+                'supplier': 'Supplier 1',
+                'lead_time_days': 5
+            }
+        ]
+    }
+}
+
+SAMPLE_EXPORT_JSON = orjson.dumps(SAMPLE_EXPORT) if orjson is not None else json.dumps(SAMPLE_EXPORT).encode()
+
+
+@pytest.fixture(autouse=True)
+def _cwd(monkeypatch, tmp_path):
+    """Run every test from its own tmp_path; pytest restores the cwd afterwards"""
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.fixture(scope="session")
+def pipeline():
+    """Namespace of the pipeline modules, plus pandas as `pd` and pyarrow as `pa`"""
+    modules = {name: importlib.import_module(name) for name in PIPELINE_MODULES}
+    return SimpleNamespace(
+        pd=importlib.import_module('pandas'),
+        pa=importlib.import_module('pyarrow'),
+        **modules
+    )
+
+
+@pytest.fixture(scope="session")
+def export_file(tmp_path_factory):
+    """A single-day PowerApps export with one record per entity"""
+    input_dir = tmp_path_factory.mktemp("input")
+    test_file = input_dir / 'test_export.json'
+    test_file.write_bytes(SAMPLE_EXPORT_JSON)
+    
+    return test_file
+
+
+@pytest.fixture(scope="session")
+def bulk_exports(pipeline):
+    """
+    10,000 synthetic raw records per entity, for asserting transform
+    invariants over whole columns rather than a single row
+    """
+    pd = pipeline.pd
+    import numpy as np
+    
+    rng = np.random.default_rng(0)
+    n = 10_000
+    created = np.datetime64('2024-01-01') + rng.integers(0, 365, n).astype('timedelta64[D]')
+    close = created + rng.integers(1, 180, n).astype('timedelta64[D]')
+    quantity = rng.integers(0, 500, n)
+    unit_cost = rng.uniform(10, 1000, n).round(2)
+    
+    return {
+        'opportunities': pd.DataFrame({
+            'opportunity_id': [f"OPP{i:05d}" for i in range(n)],
+            'customer': rng.choice(['Acme Corp', 'Globex', 'Initech'], n),
+            'product': rng.choice(['Laptop', 'Server', 'Software License'], n),
+            'amount': rng.uniform(1_000, 500_000, n).round(2),
+            'probability': rng.choice([10, 25, 50, 75, 90, 100], n),
+            'created_date': np.datetime_as_string(created),
+            'close_date': np.datetime_as_string(close),
+            'last_modified': np.datetime_as_string(close),
+            'notes': rng.choice(['', ' Follow up ', 'Hot lead'], n),
+        }),
+        'feedback': pd.DataFrame({
+            'feedback_id': [f"FB{i:05d}" for i in range(n)],
+            'rating': rng.integers(1, 6, n),
+            'comment': rng.choice(['', 'Great', ' Slow delivery '], n),
+            'submitted_date': np.datetime_as_string(created),
+            'response_days': rng.integers(0, 10, n),
+        }),
+        'inventory': pd.DataFrame({
+            'item_id': [f"INV{i:05d}" for i in range(n)],
+            'quantity': quantity,
+            'reorder_point': rng.integers(10, 100, n),
+            'status': rng.choice(['In Stock', 'Low Stock', 'On Order', 'Out of Stock'], n),
+            'unit_cost': unit_cost,
+            'unit_price': (unit_cost * rng.uniform(1.1, 2.0, n)).round(2),
+            'last_updated': np.datetime_as_string(created),
+        }),
+    }
+
+
+def _opportunities_frame():
+    """Two transformed opportunities, as the transformer would hand them to the loader"""
+    import pandas as pd
+    
+    return pd.DataFrame({
+        'opportunity_id': ['OPP001', 'OPP002'],
+        'name': ['Test Opp 1', 'Test Opp 2'],
+        'customer': ['Customer A', 'Customer B'],
+        'product': ['Laptop', 'Server'],
+        'amount': [50000.0, 150000.0],
+        'probability': [80, 60],
+        'stage': ['Negotiation', 'Proposal'],
+        'region': ['North America', 'EMEA'],
+        'sales_rep': ['rep1@test.com', 'rep2@test.com'],
+        'created_date': ['2024-01-15', '2024-01-16'],
+        'close_date': ['2024-03-15', '2024-04-16'],
+        'actual_revenue': [0, 0],
+        'notes': ['', ''],
+        'weighted_amount': [40000.0, 90000.0],
+        'days_to_close': [60, 91],
+        'deal_size': ['Medium', 'Large'],
+        'high_value': [0, 1],
+        'created_month': ['2024-01', '2024-01'],
+        'created_year': [2024, 2024]
+    })
+
+
+def _feedback_frame():
+    """Two transformed feedback records, as the transformer would hand them to the loader"""
+    import pandas as pd
+    
+    return pd.DataFrame({
+        'feedback_id': ['FB001', 'FB002'],
+        'customer': ['Customer A', 'Customer B'],
+        'feedback_type': ['Product', 'Service'],
+        'rating': [4, 5],
+        'comment': ['Good', 'Excellent'],
+        'submitted_date': ['2024-01-15', '2024-01-16'],
+        'responded': [1, 1],
+        'response_days': [2, 1],
+        'source': ['Web', 'Email'],
+        'sentiment': ['Positive', 'Positive'],
+        'has_comment': [1, 1],
+        'responded_within_2days': [1, 1],
+        'submitted_month': ['2024-01', '2024-01']
+    })
+
+
+@pytest.fixture
+def opportunities_df():
+    """Fresh in-memory opportunities frame (the loader rewrites date columns in place)"""
+    return _opportunities_frame()
+
+
+@pytest.fixture
+def feedback_df():
+    """Fresh in-memory feedback frame (the loader rewrites date columns in place)"""
+    return _feedback_frame()
+
+
+@pytest.fixture(scope="session")
+def export_parquet(pipeline, export_file):
+    """
+    The sample export's entities pre-compiled to one parquet file each, so
+    transform tests can memory-map them instead of re-parsing the JSON
+    """
+    import pyarrow.parquet as pq
+    
+    paths = {}
+    for entity, records in SAMPLE_EXPORT['data'].items():
+        paths[entity] = export_file.parent / f"test_export_{entity}.parquet"
+        pq.write_table(pipeline.pa.Table.from_pylist(records), paths[entity])
+    
+    return paths
+
+
+@pytest.fixture(scope="session")
+def processed_dir(tmp_path_factory):
+    """Transformed parquet files on disk, for tests that exercise the parquet read path"""
+    processed = tmp_path_factory.mktemp("processed")
+    _opportunities_frame().to_parquet(processed / 'transformed_opportunities_20240115.parquet')
+    _feedback_frame().to_parquet(processed / 'transformed_feedback_20240115.parquet')
+    
+    return processed
+
+
+# Tables a test can write to; emptied between tests instead of rebuilding the schema
+LOADER_TABLES = ['opportunities', 'customer_feedback', 'inventory', 'load_history', 'sales_summary']
+
+
+@pytest.fixture(scope="session")
+def _session_loader(pipeline, tmp_path_factory):
+    """
+    One connected loader for the whole session, backed by a named
+    shared-cache in-memory database (other connections can open the same URI)
+    """
+    loader = pipeline.load_to_database.PowerAppsDataLoader(
+        db_path="file:test_loader?mode=memory&cache=shared",
+        processed_dir=str(tmp_path_factory.getbasetemp()),
+        uri=True
+    )
+    loader.connect()
+    # Nothing here needs to survive a crash - skip syncs and journal files
+    for pragma in ("synchronous = OFF", "journal_mode = MEMORY",
+                   "temp_store = MEMORY", "locking_mode = EXCLUSIVE"):
+        loader.conn.execute(f"PRAGMA {pragma}")
+    loader.create_tables()
+    yield loader
+    loader.close()
+
+
+@pytest.fixture
+def memory_loader(_session_loader, tmp_path):
+    """The session loader with every table emptied"""
+    with _session_loader.conn:
+        for table in LOADER_TABLES:
+            _session_loader.conn.execute(f"DELETE FROM {table}")
+    _session_loader.processed_dir = str(tmp_path)
+    return _session_loader
+
+
+@pytest.fixture(scope="session")
+def historical_exports(pipeline, tmp_path_factory):
+    """
+    Factory for seeded simulator output directories, generated once per
+    `days` value and shared read-only by every test that asks for the same
+    span (copy the directory first to modify it)
+    """
+    cache = {}
+    
+    def _exports(days: int):
+        if days not in cache:
+            output_dir = tmp_path_factory.mktemp(f"exports_{days}d")
+            simulator = pipeline.export_simulator.PowerAppsExportSimulator(output_dir=str(output_dir), seed=days)
+            simulator.generate_historical_exports(days=days)
+            cache[days] = output_dir
+        return cache[days]
+    
+    return _exports
@@ -3,21 +3,55 @@
 Test runner for PowerApps Pipeline tests
 """
 
-import unittest
+import importlib.util
+import json
 import sys
 import os
+from datetime import datetime
+
+import pytest
+
+try:
+    import orjson
+except ImportError:  # Optional - fall back to the stdlib encoder
+    orjson = None
+
+REPORT_FILE = 'test_report.json'
+
 
 if __name__ == '__main__':
     # Add parent directory to path
     sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
     
-    # Discover and run tests
-    loader = unittest.TestLoader()
-    start_dir = os.path.dirname(__file__)
-    suite = loader.discover(start_dir, pattern='test_*.py')
+    # Let pytest collect the test modules under this directory
+    start_dir = os.path.abspath(os.path.dirname(__file__))
+    args = [start_dir]
+    
+    # Spread tests across cores when pytest-xdist is available
+    if importlib.util.find_spec('xdist'):
+        args += ['-n', 'auto', '--dist=loadgroup']
+    
+    # pytest-json-report writes the full per-test report itself
+    json_plugin = importlib.util.find_spec('pytest_jsonreport') is not None
+    if json_plugin:
+        args += ['--json-report', f'--json-report-file={REPORT_FILE}']
+    
+    exit_code = pytest.main(args + sys.argv[1:])
+    
+    if not json_plugin:
+        report = {
+            'timestamp': datetime.now().isoformat(),
+            'success': exit_code == 0,
+            'exit_code': int(exit_code)
+        }
+        if orjson is not None:
+            with open(REPORT_FILE, 'wb') as f:
+                f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+        else:
+            with open(REPORT_FILE, 'w') as f:
+                json.dump(report, f, indent=2)
     
-    runner = unittest.TextTestRunner(verbosity=2)
-    result = runner.run(suite)
+    print(f"\n📊 Test report saved to {REPORT_FILE}")
     
     # Exit with non-zero code if tests failed
-    sys.exit(not result.wasSuccessful())
+    sys.exit(exit_code)
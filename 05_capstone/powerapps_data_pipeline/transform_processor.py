@@ -7,12 +7,21 @@ Cleans, validates, and enriches PowerApps export data
 import json
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 from datetime import datetime
 import os
 import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from typing import Dict, List, Any, Optional
 import logging
 
+try:
+    import orjson
+except ImportError:  # Optional - fall back to the stdlib parser
+    orjson = None
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -20,105 +29,240 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def _parse_dates(values: pd.Series) -> pd.Series:
+    """
+    Parse PowerApps ISO-8601 timestamps; columns that are already datetime
+    (e.g. re-runs on parquet input) are passed through untouched. Values with
+    a zone offset are converted to UTC, so a column mixing offset and naive
+    timestamps comes back naive like the rest of the pipeline expects
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    # Explicit format skips per-value inference; cache dedupes the many repeated dates
+    return pd.to_datetime(values, format='ISO8601', cache=True, utc=True).dt.tz_convert(None)
+
+# pandas 3 always copies on write; pandas 2 still tracks chained slices
+COPY_ON_WRITE = int(pd.__version__.split('.')[0]) >= 3
+
+try:
+    # Arrow-backed strings with NaN for missing values (the pandas 3 default)
+    ARROW_STRING = pd.StringDtype('pyarrow', na_value=np.nan)
+except TypeError:  # pandas 2.1-2.2 (requirements.txt pins >=2.1)
+    ARROW_STRING = pd.StringDtype('pyarrow_numpy')
+
+def _parse_date_columns(df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    """
+    Parse several timestamp columns with one Arrow cast over a table of the
+    text columns; if Arrow rejects any value (zone offsets, malformed dates)
+    every column goes through _parse_dates instead, which normalizes offsets
+    to naive UTC and raises on dates it cannot parse
+    """
+    pending = [c for c in columns if not pd.api.types.is_datetime64_any_dtype(df[c])]
+    parsed = {c: df[c] for c in columns if c not in pending}
+    if pending:
+        try:
+            text = pa.table({c: pa.array(df[c], type=pa.string(), from_pandas=True) for c in pending})
+            cast = text.cast(pa.schema([(c, pa.timestamp('us')) for c in pending])).to_pandas()
+            cast.index = df.index
+            parsed.update({c: cast[c] for c in pending})
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            parsed.update({c: _parse_dates(df[c]) for c in pending})
+    return pd.DataFrame(parsed, index=df.index)[columns]
+
+def _days_between(start: pd.Series, end: pd.Series) -> np.ndarray:
+    """
+    Whole days from start to end (floored, like .dt.days) as int32, worked
+    out on the raw datetime64 arrays whatever their unit; float with NaN
+    where either date is missing
+    """
+    days = (end.to_numpy() - start.to_numpy()).astype('timedelta64[D]')
+    missing = np.isnat(days)
+    if missing.any():
+        return np.where(missing, np.nan, days.view('i8'))
+    return days.view('i8').astype(np.int32)
+
+def _null_counts(df: pd.DataFrame) -> Dict[str, int]:
+    """
+    Missing values per column - read off the Arrow validity bitmap for
+    Arrow-backed columns (text, ArrowDtype), an isnull scan for the rest
+    """
+    counts = {}
+    for name, values in df.items():
+        dtype = values.dtype
+        if isinstance(dtype, pd.ArrowDtype) or (
+                isinstance(dtype, pd.StringDtype) and dtype.storage.startswith('pyarrow')):
+            counts[name] = pa.array(values).null_count
+        else:
+            counts[name] = int(values.isnull().sum())
+    return counts
+
+def _months(values: pd.Series) -> np.ndarray:
+    """Calendar month of each timestamp as datetime64[M] (NaT stays NaT)"""
+    return values.to_numpy().astype('datetime64[M]')
+
+def _month_labels(months: np.ndarray, index: pd.Index) -> pd.Series:
+    """'YYYY-MM' text for each month, missing where the month is NaT"""
+    labels = pd.Series(np.datetime_as_string(months, unit='M'), index=index)
+    return labels.where(~np.isnat(months))
+
+def _arrow_strings(values: pd.Series) -> pd.Series:
+    """
+    Cast text columns to Arrow-backed strings so the .str methods run as
+    Arrow compute kernels instead of a Python loop over object cells
+    """
+    if isinstance(values.dtype, (pd.StringDtype, pd.ArrowDtype)):
+        return values
+    return values.astype(ARROW_STRING)
+
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December']
+
+# Bucket labels, indexed by the integer codes the transforms compute
+DEAL_SIZES = ['Small', 'Medium', 'Large', 'Enterprise', 'Unknown']
+SENTIMENTS = ['Negative', 'Neutral', 'Positive', 'Unknown']
+TURNOVER_CATEGORIES = ['Low', 'Medium', 'High']
+
+# Primary key of each export entity; a unique key rules out duplicate rows
+ENTITY_ID_COLUMNS = {
+    'opportunities': 'opportunity_id',
+    'feedback': 'feedback_id',
+    'inventory': 'item_id'
+}
+
+# Parquet writer settings: ZSTD with dictionary pages suits the small,
+# repetitive entity tables (status, deal size, sentiment, ...)
+PARQUET_OPTIONS = {
+    'engine': 'pyarrow',
+    'compression': 'zstd',
+    'compression_level': 3,
+    'use_dictionary': True,
+    'data_page_size': 1 << 20
+}
+MAX_ROW_GROUP_SIZE = 100_000
+
+# Ascending bucket edges for np.searchsorted - an amount equal to an edge
+# falls in the upper bucket, a rating equal to an edge in the lower one
+DEAL_SIZE_EDGES = np.array([50000, 100000, 250000])
+SENTIMENT_EDGES = np.array([2, 3])
+
+# Health score per stock status; any other status takes the last (0) entry
+HEALTH_STATUSES = pd.Index(['In Stock', 'Low Stock', 'On Order'])
+HEALTH_SCORES = np.array([100, 50, 25, 0])
+
 class PowerAppsDataTransformer:
     """
     Transforms raw PowerApps exports into clean, analysis-ready data
     """
     
-    def __init__(self, input_dir: str = "sample_exports", output_dir: str = "processed_data"):
+    def __init__(self, input_dir: str = "sample_exports", output_dir: str = "processed_data",
+                 force: bool = False):
         self.input_dir = input_dir
         self.output_dir = output_dir
+        # Re-transform entities even when their output is newer than the source
+        self.force = force
         os.makedirs(output_dir, exist_ok=True)
         
         self.quality_reports = []
+        # Per-file results of the last run() over this transformer
+        self.results = []
+        
+        # Transform per entity; entities not listed are saved as exported
+        self.transforms = {
+            'opportunities': self.transform_opportunities,
+            'feedback': self.transform_feedback,
+            'inventory': self.transform_inventory
+        }
         
     def load_export_file(self, filepath: str) -> Dict:
         """Load a single export file"""
+        if orjson is not None:
+            with open(filepath, 'rb') as f:
+                return orjson.loads(f.read())
         with open(filepath, 'r') as f:
             return json.load(f)
     
     def transform_opportunities(self, df: pd.DataFrame) -> pd.DataFrame:
         """Transform and enrich opportunities data"""
         
-        # Make a copy to avoid warnings
-        df_clean = df.copy()
-        
-        # 1. Remove any completely empty rows
-        df_clean = df_clean.dropna(how='all')
+        # 1. Remove any completely empty rows (this already returns a new frame,
+        #    so under copy-on-write no defensive copy of the input is needed)
+        df_clean = df.dropna(how='all')
+        if not COPY_ON_WRITE:
+            # pandas 2 marks a frame that lost rows as a slice of df; copy it so
+            # the column assignments below don't raise SettingWithCopyWarning
+            df_clean = df_clean.copy()
         
         # 2. Convert date columns
-        df_clean['created_date'] = pd.to_datetime(df_clean['created_date'])
-        df_clean['close_date'] = pd.to_datetime(df_clean['close_date'])
-        df_clean['last_modified'] = pd.to_datetime(df_clean['last_modified'])
+        date_columns = ['created_date', 'close_date', 'last_modified']
+        df_clean[date_columns] = _parse_date_columns(df_clean, date_columns)
         
         # 3. Calculate derived fields
-        df_clean['days_to_close'] = (df_clean['close_date'] - df_clean['created_date']).dt.days
+        df_clean['days_to_close'] = _days_between(df_clean['created_date'], df_clean['close_date'])
         
         # 4. Calculate weighted amount (probability * amount)
         df_clean['weighted_amount'] = df_clean['amount'] * (df_clean['probability'] / 100)
         
         # 5. Create month/year for grouping
-        df_clean['created_month'] = df_clean['created_date'].dt.to_period('M')
+        months = _months(df_clean['created_date'])
+        df_clean['created_month'] = _month_labels(months, df_clean.index)
         df_clean['created_year'] = df_clean['created_date'].dt.year
-        df_clean['created_month_name'] = df_clean['created_date'].dt.strftime('%B')
+        # Months since 1970 modulo 12 is the month of the year; -1 marks NaT
+        month_codes = np.where(np.isnat(months), -1, months.view('i8') % 12)
+        df_clean['created_month_name'] = pd.Categorical.from_codes(month_codes, MONTH_NAMES)
         
         # 6. Categorize deal size
-        conditions = [
-            df_clean['amount'] < 50000,
-            df_clean['amount'] < 100000,
-            df_clean['amount'] < 250000,
-            df_clean['amount'] >= 250000
-        ]
-        choices = ['Small', 'Medium', 'Large', 'Enterprise']
-        df_clean['deal_size'] = np.select(conditions, choices, default='Unknown')
+        amount = df_clean['amount'].to_numpy(dtype=float, na_value=np.nan)
+        codes = np.searchsorted(DEAL_SIZE_EDGES, amount, side='right')
+        codes[np.isnan(amount)] = DEAL_SIZES.index('Unknown')
+        df_clean['deal_size'] = pd.Categorical.from_codes(codes, DEAL_SIZES)
         
         # 7. Flag high-value opportunities
         df_clean['high_value'] = df_clean['amount'] > 100000
         
         # 8. Clean text fields
-        df_clean['notes'] = df_clean['notes'].fillna('').astype(str).str.strip()
-        df_clean['customer'] = df_clean['customer'].str.strip()
-        df_clean['product'] = df_clean['product'].str.strip()
+        df_clean['notes'] = _arrow_strings(df_clean['notes']).fillna('').str.strip()
+        df_clean['customer'] = _arrow_strings(df_clean['customer']).str.strip()
+        df_clean['product'] = _arrow_strings(df_clean['product']).str.strip()
         
         return df_clean
     
     def transform_feedback(self, df: pd.DataFrame) -> pd.DataFrame:
         """Transform and enrich feedback data"""
         
-        df_clean = df.copy()
+        # Shallow copy - new columns go on our frame, no column data is duplicated
+        df_clean = df.copy(deep=False)
         
         # 1. Convert dates
-        df_clean['submitted_date'] = pd.to_datetime(df_clean['submitted_date'])
+        df_clean['submitted_date'] = _parse_dates(df_clean['submitted_date'])
         
         # 2. Handle missing comments
         df_clean['has_comment'] = df_clean['comment'].notna() & (df_clean['comment'] != '')
-        df_clean['comment'] = df_clean['comment'].fillna('').astype(str).str.strip()
+        df_clean['comment'] = _arrow_strings(df_clean['comment']).fillna('').str.strip()
         
         # 3. Categorize sentiment based on rating
-        conditions = [
-            df_clean['rating'] <= 2,
-            df_clean['rating'] == 3,
-            df_clean['rating'] >= 4
-        ]
-        choices = ['Negative', 'Neutral', 'Positive']
-        df_clean['sentiment'] = np.select(conditions, choices, default='Unknown')
+        # (ratings are whole stars, so everything above 3 is Positive)
+        rating = df_clean['rating'].to_numpy(dtype=float, na_value=np.nan)
+        codes = np.searchsorted(SENTIMENT_EDGES, rating, side='left')
+        codes[np.isnan(rating)] = SENTIMENTS.index('Unknown')
+        df_clean['sentiment'] = pd.Categorical.from_codes(codes, SENTIMENTS)
         
         # 4. Calculate response metrics
         df_clean['response_days'] = pd.to_numeric(df_clean['response_days'], errors='coerce')
         df_clean['responded_within_2days'] = df_clean['response_days'] <= 2
         
         # 5. Month/year for grouping
-        df_clean['submitted_month'] = df_clean['submitted_date'].dt.to_period('M')
+        df_clean['submitted_month'] = _month_labels(_months(df_clean['submitted_date']), df_clean.index)
         
         return df_clean
     
     def transform_inventory(self, df: pd.DataFrame) -> pd.DataFrame:
         """Transform and enrich inventory data"""
         
-        df_clean = df.copy()
+        # Shallow copy - new columns go on our frame, no column data is duplicated
+        df_clean = df.copy(deep=False)
         
         # 1. Convert dates
-        df_clean['last_updated'] = pd.to_datetime(df_clean['last_updated'])
+        df_clean['last_updated'] = _parse_dates(df_clean['last_updated'])
         
         # 2. Calculate inventory value
         df_clean['inventory_value'] = df_clean['quantity'] * df_clean['unit_cost']
@@ -129,31 +273,15 @@ class PowerAppsDataTransformer:
         # 3. Flag items needing reorder
         df_clean['needs_reorder'] = df_clean['quantity'] <= df_clean['reorder_point']
         
-        # 4. Inventory health score (0-100)
-        df_clean['health_score'] = np.where(
-            df_clean['status'] == 'In Stock',
-            100,
-            np.where(
-                df_clean['status'] == 'Low Stock',
-                50,
-                np.where(
-                    df_clean['status'] == 'On Order',
-                25,
-                0
-                )
-            )
-        )
-        
-        # 5. Calculate turnover category
-        df_clean['turnover_category'] = np.where(
-            df_clean['quantity'] > df_clean['reorder_point'] * 3,
-            'High',
-            np.where(
-                df_clean['quantity'] > df_clean['reorder_point'],
-                'Medium',
-                'Low'
-            )
-        )
+        # 4. Inventory health score (0-100) - one lookup on the status codes
+        status_codes = HEALTH_STATUSES.get_indexer(df_clean['status'])
+        df_clean['health_score'] = HEALTH_SCORES[status_codes]
+        
+        # 5. Calculate turnover category (0 = Low, 1 = Medium, 2 = High)
+        quantity = df_clean['quantity'].to_numpy(dtype=float)
+        reorder_point = df_clean['reorder_point'].to_numpy(dtype=float)
+        codes = (quantity > reorder_point).astype(np.int8) + (quantity > reorder_point * 3)
+        df_clean['turnover_category'] = pd.Categorical.from_codes(codes, TURNOVER_CATEGORIES)
         
         return df_clean
     
@@ -161,6 +289,9 @@ class PowerAppsDataTransformer:
                               transformed_df: pd.DataFrame, export_date: str) -> Dict:
         """Generate data quality report for transformation"""
         
+        # One null count per frame; the totals below reuse the per-column counts
+        null_counts_after = _null_counts(transformed_df)
+        
         report = {
             'entity': entity_name,
             'export_date': export_date,
@@ -168,19 +299,23 @@ class PowerAppsDataTransformer:
             'original_row_count': len(original_df),
             'transformed_row_count': len(transformed_df),
             'columns_added': list(set(transformed_df.columns) - set(original_df.columns)),
-            'null_counts_before': original_df.isnull().sum().to_dict(),
-            'null_counts_after': transformed_df.isnull().sum().to_dict(),
+            'null_counts_before': _null_counts(original_df),
+            'null_counts_after': null_counts_after,
             'data_quality_score': 100
         }
         
         # Calculate quality score
         if len(original_df) > 0:
             # Check for missing data
-            missing_pct = transformed_df.isnull().sum().sum() / (len(transformed_df) * len(transformed_df.columns))
+            missing_pct = sum(null_counts_after.values()) / (len(transformed_df) * len(transformed_df.columns))
             report['data_quality_score'] -= missing_pct * 50
             
-            # Check for duplicates
-            duplicate_pct = transformed_df.duplicated().sum() / len(transformed_df)
+            # Check for duplicates - skip the row-hashing pass when the key is unique
+            id_column = ENTITY_ID_COLUMNS.get(entity_name)
+            if id_column in transformed_df.columns and transformed_df[id_column].is_unique:
+                duplicate_pct = 0
+            else:
+                duplicate_pct = transformed_df.duplicated().sum() / len(transformed_df)
             report['data_quality_score'] -= duplicate_pct * 30
         
         report['data_quality_score'] = max(0, round(report['data_quality_score'], 2))
@@ -195,6 +330,7 @@ class PowerAppsDataTransformer:
         # Load data
         export_data = self.load_export_file(filepath)
         export_date = export_data['export_date']
+        source_mtime = os.path.getmtime(filepath)
         
         results = {
             'export_date': export_date,
@@ -208,27 +344,43 @@ class PowerAppsDataTransformer:
                 logger.warning(f"  No data for {entity}")
                 continue
             
+            output_filename = f"transformed_{entity}_{export_date}.parquet"
+            output_path = os.path.join(self.output_dir, output_filename)
+            report_path = output_path.replace('.parquet', '.report.json')
+            
+            # Skip entities already transformed since the source last changed
+            if (not self.force and os.path.exists(output_path) and os.path.exists(report_path)
+                    and os.path.getmtime(output_path) > source_mtime
+                    and os.path.getmtime(report_path) > source_mtime):
+                with open(report_path) as f:
+                    report = json.load(f)
+                self.quality_reports.append(report)
+                results['transformed'][entity] = {
+                    'records': report['transformed_row_count'],
+                    'output_file': output_filename,
+                    'quality_score': report['data_quality_score']
+                }
+                logger.info(f"  {entity}: up to date, skipped")
+                continue
+            
             original_df = pd.DataFrame(data)
             logger.info(f"  {entity}: {len(original_df)} records")
             
             # Apply appropriate transformation
-            if entity == 'opportunities':
-                transformed_df = self.transform_opportunities(original_df)
-            elif entity == 'feedback':
-                transformed_df = self.transform_feedback(original_df)
-            elif entity == 'inventory':
-                transformed_df = self.transform_inventory(original_df)
-            else:
-                transformed_df = original_df
+            transform = self.transforms.get(entity)
+            transformed_df = transform(original_df) if transform else original_df
             
             # Save transformed data
-            output_filename = f"transformed_{entity}_{export_date}.parquet"
-            output_path = os.path.join(self.output_dir, output_filename)
-            transformed_df.to_parquet(output_path, index=False)
+            transformed_df.to_parquet(output_path, index=False,
+                                      row_group_size=min(len(transformed_df), MAX_ROW_GROUP_SIZE) or None,
+                                      **PARQUET_OPTIONS)
             
             # Generate quality report
             report = self.generate_quality_report(entity, original_df, transformed_df, export_date)
             self.quality_reports.append(report)
+            # Written after the parquet so a complete sidecar marks a finished entity
+            with open(report_path, 'w') as f:
+                json.dump(report, f, indent=2, default=str)
             
             results['transformed'][entity] = {
                 'records': len(transformed_df),
@@ -240,18 +392,37 @@ class PowerAppsDataTransformer:
         
         return results
     
-    def process_all(self) -> List[Dict]:
-        """Process all export files in input directory"""
+    def process_all(self, max_workers: int = 1) -> List[Dict]:
+        """
+        Process all export files in input directory. By default everything
+        runs in this process; files are independent, so max_workers > 1
+        spreads them over a process pool - only worth it for large exports,
+        as each worker pays the pandas/pyarrow import again
+        """
         
         results = []
         files = sorted([f for f in os.listdir(self.input_dir) if f.endswith('.json')])
+        filepaths = [os.path.join(self.input_dir, filename) for filename in files]
         
         logger.info(f"Found {len(files)} files to process")
         
-        for filename in files:
-            filepath = os.path.join(self.input_dir, filename)
-            result = self.process_file(filepath)
-            results.append(result)
+        workers = min(max_workers or 1, len(filepaths))
+        if workers > 1:
+            # Workers come from a clean server process rather than a fork of this
+            # one, which may be running other pipeline steps on threads
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context(method)) as executor:
+                # Reports come back with each result - workers can't append to ours
+                for result, reports in executor.map(_process_export, repeat(self.input_dir),
+                                                    repeat(self.output_dir), repeat(self.force),
+                                                    filepaths):
+                    results.append(result)
+                    self.quality_reports.extend(reports)
+        else:
+            for filepath in filepaths:
+                result = self.process_file(filepath)
+                results.append(result)
         
         # Save combined quality report
         report_path = os.path.join(self.output_dir, f"quality_report_{datetime.now().strftime('%Y%m%d')}.json")
@@ -269,11 +440,32 @@ class PowerAppsDataTransformer:
         
         return results
 
+def _process_export(input_dir: str, output_dir: str, force: bool, filepath: str):
+    """Process one export file in a pool worker; returns (results, quality reports)"""
+    transformer = PowerAppsDataTransformer(input_dir, output_dir, force)
+    results = transformer.process_file(filepath)
+    return results, transformer.quality_reports
+
+def run(input_dir: str = "sample_exports", output_dir: str = "processed_data",
+        file: Optional[str] = None, workers: Optional[int] = None,
+        force: bool = False) -> PowerAppsDataTransformer:
+    """Transform exports - shared by the CLI and the pipeline orchestrator"""
+    transformer = PowerAppsDataTransformer(input_dir, output_dir, force)
+    
+    if file:
+        transformer.results = [transformer.process_file(os.path.join(input_dir, file))]
+    else:
+        transformer.results = transformer.process_all(max_workers=workers)
+    
+    return transformer
+
 def main():
     parser = argparse.ArgumentParser(description='Transform PowerApps export data')
     parser.add_argument('--input', type=str, default='sample_exports', help='Input directory')
     parser.add_argument('--output', type=str, default='processed_data', help='Output directory')
     parser.add_argument('--file', type=str, help='Process single file (optional)')
+    parser.add_argument('--workers', type=int, help='Worker processes for large backfills (default: 1, in-process)')
+    parser.add_argument('--force', action='store_true', help='Re-transform files that are already up to date')
     
     args = parser.parse_args()
     
@@ -281,14 +473,12 @@ def main():
     print("🔄 PowerApps Data Transformer")
     print("="*60)
     
-    transformer = PowerAppsDataTransformer(args.input, args.output)
+    transformer = run(args.input, args.output, args.file, args.workers, args.force)
     
     if args.file:
-        results = transformer.process_file(os.path.join(args.input, args.file))
         print(f"\n✅ Processed: {args.file}")
     else:
-        results = transformer.process_all()
-        print(f"\n✅ Processed {len(results)} files")
+        print(f"\n✅ Processed {len(transformer.results)} files")
     
     print("\n📊 Quality Summary:")
     for report in transformer.quality_reports[-5:]:  # Show last 5